@@ -1,12 +1,19 @@
 #%% Imports.
+import asyncio
+import functools
 import urllib
+from typing import NamedTuple
+import pyodbc
 import streamlit as st
 import sqlalchemy as alc
+from sqlalchemy.engine import Engine
 import pandas as pd
+import numpy as np
 import altair as alt
 
 #%% Connect to SQL server using SQL alchemy.
 
+@st.cache_resource
 def connect_to_sql_alchemy_server():
     """
     :param   server:    Name of SQL server you want to connect to.
@@ -25,25 +32,50 @@ def connect_to_sql_alchemy_server():
                                      f'SERVER=tcp:{server},1433;'
                                      f'DATABASE={database};'
                                      f'UID={username};'
-                                     f'PWD={password}')
+                                     f'PWD={password};'
+                                     'Encrypt=yes;'
+                                     'TrustServerCertificate=no;')
     conn_string = "mssql+pyodbc:///?odbc_connect={}".format(params)
 
-    # Foreign SQL server can't handle all rows being inserted at once, so fast_executemany is set to False.
-    engine = alc.create_engine(conn_string, echo=False, pool_pre_ping=True)
-    print("Now connected to server")
+    # Engine is only used for reads, and is cached as a resource, so one connection pool is shared across all sessions
+    # and reruns. Pool is sized for several users at once, each session running in its own thread, and waits up to 30
+    # seconds for a free connection when all are in use. Connections are recycled before Azure drops them after 30
+    # minutes idle, rather than pinging the server before every query. A connection dropped anyway is handled by
+    # retry_on_disconnect.
+    engine = alc.create_engine(conn_string, echo=False, pool_size=20, max_overflow=40, pool_timeout=30,
+                               pool_recycle=1500)
 
     return engine
 
+# Engines can't be hashed, so loaders that take the engine as a parameter leave it out of their cache key.
+engine_hash_funcs = {Engine: lambda _: None}
+
+#%% Decorator to retry a loader once if its connection to the server was dropped.
+
+def retry_on_disconnect(func):
+    """
+    :param func: Loader function that queries the SQL server.
+    :return: Loader that is run a second time if the first attempt fails on a dropped connection.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except (alc.exc.OperationalError, pyodbc.OperationalError):
+            # Dropped connection has been discarded from the pool, so the second attempt gets a fresh one.
+            return func(*args, **kwargs)
+
+    return wrapper
+
 #%% Function to load latest game date.
 
-@st.cache_data(ttl=600)
-def load_latest_game_date():
+@st.cache_data(ttl=600, show_spinner=False, hash_funcs=engine_hash_funcs)
+@retry_on_disconnect
+def load_latest_game_date(sql_engine):
     """
+    :param sql_engine: SQL alchemy engine connected to desired SQL server.
     :return: Date of the latest game included in the dataframe.
     """
-    # Connect to SQL server.
-    sql_engine = connect_to_sql_alchemy_server()
-
     # Select latest game date.
     query = """
                 SELECT
@@ -52,240 +84,408 @@ def load_latest_game_date():
     """
 
     # Convert query to date.
-    latest_game_date = pd.read_sql(query, sql_engine)["latest_game_date"].iloc[0]
+    latest_game_date = pd.read_sql_query(query, sql_engine)["latest_game_date"].iloc[0]
 
     return latest_game_date
 
 #%% Function to load all unique competition names.
 
-@st.cache_data(ttl=600)
-def load_competitions():
+# Competitions rarely change, so they are kept in memory for a day before being reloaded.
+@st.cache_data(ttl=86400, show_spinner=False, hash_funcs=engine_hash_funcs)
+@retry_on_disconnect
+def load_competitions(sql_engine):
     """
+    :param sql_engine: SQL alchemy engine connected to desired SQL server.
     :return: List containing all unique competition names.
     """
-    # Connect to SQL server.
-    sql_engine = connect_to_sql_alchemy_server()
-
     # Select all distinct competitions names.
     query = """
                 SELECT DISTINCT
                     competition_name
                 FROM streamlit.Fbref_Appearances
+                ORDER BY competition_name
     """
 
-    # Convert query to list.
-    competitions = pd.read_sql(query, sql_engine)["competition_name"].tolist()
+    # Convert query to list, already sorted by the server.
+    competitions = pd.read_sql_query(query, sql_engine)["competition_name"].tolist()
 
     return competitions
 
-#%% Function to load the minimum and maximum number of seasons a player has played in a selected competition(s).
+#%% Function to load every player, and their number of seasons, in the selected competition(s).
 
-@st.cache_data(ttl=600)
-def load_number_of_seasons(selected_comps):
+@st.cache_data(ttl=600, hash_funcs=engine_hash_funcs)
+@retry_on_disconnect
+def load_competition_players(sql_engine, selected_comps):
     """
-    :param selected_comps: List of competition names as selected in previous filter.
-    :return: Minimum and maximum number of seasons in selected competition(s).
+    :param sql_engine: SQL alchemy engine connected to desired SQL server.
+    :param selected_comps: Tuple of competition names as selected in previous filter.
+    :return: Dataframe containing each unique player and the number of seasons they have played in selected competition(s).
     """
-    # Return empty list if no competition selected.
+    # Return empty dataframe if no competition selected.
     if not selected_comps:
-        return []
+        return pd.DataFrame(columns=["player_name", "number_of_seasons"])
 
-    # Connect to SQL server.
-    sql_engine = connect_to_sql_alchemy_server()
-
-    # Create a string of ?s, followed by a comma, the ?s will be replaced by the selected competitions. SQL Server uses ? placeholders.
-    placeholders = ",".join(["?"] * len(selected_comps))
-
-    # SQL query for unique players.
-    query = f"""
+    # SQL query for unique players and their number of seasons. Both the seasons slider and the player filter are built
+    # from this one result, so moving the slider doesn't need another round-trip to the server.
+    query = """
         SELECT
-            MAX(number_of_seasons) AS max_seasons
+            player_name,
+            MAX(number_of_seasons) AS number_of_seasons
         FROM streamlit.Fbref_Appearances
-        WHERE competition_name IN ({placeholders})
+        WHERE competition_name IN (SELECT value FROM STRING_SPLIT(?, '|'))
+        GROUP BY player_name
+        ORDER BY player_name
     """
 
-    # Create dataframe using SQL query. The ?s are replaced by the selected competitions defined in params.
-    df = pd.read_sql(query, sql_engine, params=tuple(selected_comps))
+    # Create dataframe using SQL query. The selected competitions are passed as one |-separated string, so the query
+    # text (and SQL Server's cached plan for it) is the same however many competitions are selected.
+    df = pd.read_sql_query(query, sql_engine, params=("|".join(selected_comps),))
+
+    # Number of seasons fits in a 16-bit integer, which keeps the minimum seasons filter small.
+    df = df.astype({"number_of_seasons": "int16"})
+
+    return df
+
+#%% Function to load the maximum number of seasons a player has played in a selected competition(s).
+
+def load_number_of_seasons(sql_engine, selected_comps):
+    """
+    :param sql_engine: SQL alchemy engine connected to desired SQL server.
+    :param selected_comps: Tuple of competition names as selected in previous filter.
+    :return: Maximum number of seasons in selected competition(s).
+    """
+    # Return empty list if no competition selected.
+    if not selected_comps:
+        return []
 
     # Extract max seasons that one player has played in selected competitions.
-    max_seasons = int(df.iloc[0]["max_seasons"])
+    max_seasons = int(load_competition_players(sql_engine, selected_comps)["number_of_seasons"].max())
 
     return max_seasons
 
 #%% Function to load all unique players based on the competition selected.
 
-@st.cache_data(ttl=600)
-def load_players(minimum_seasons, selected_comps):
+def load_players(sql_engine, minimum_seasons, selected_comps):
     """
+    :param sql_engine: SQL alchemy engine connected to desired SQL server.
     :param minimum_seasons: Minimum number of seasons that a player must have played in selected competition(s).
-    :param selected_comps: List of competition names as selected in previous filter.
+    :param selected_comps: Tuple of competition names as selected in previous filter.
     :return: List of unique players names based on competition names that were selected.
     """
     # Return empty list if no competition selected.
     if not selected_comps:
         return []
 
-    # Connect to SQL server.
-    sql_engine = connect_to_sql_alchemy_server()
+    # Keep players with at least the minimum number of seasons.
+    df = load_competition_players(sql_engine, selected_comps)
+    df = df[df["number_of_seasons"] >= minimum_seasons]
 
-    # Create a string of ?s, followed by a comma, the ?s will be replaced by the selected competitions. SQL Server uses ? placeholders.
-    placeholders = ",".join(["?"] * len(selected_comps))
+    # Convert to list, already sorted by the server.
+    players = df["player_name"].tolist()
 
-    # SQL query for unique players.
-    query = f"""
+    return players
+
+#%% Function to run several SQL statements in a single round-trip to the server.
+
+def read_sql_batch(sql_engine, query, params):
+    """
+    :param sql_engine: SQL alchemy engine connected to desired SQL server.
+    :param query: One or more SQL statements, each returning a result set.
+    :param params: Parameters that replace the ?s in the query, in the order they appear.
+    :return: List of dataframes, one per result set, in the order the statements were written.
+    """
+    # Use the underlying pyodbc connection, as pandas can only read the first result set of a query.
+    connection = sql_engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(query, params)
+
+        # Read each result set into a dataframe, then move on to the next one until none are left.
+        dfs = []
+        while True:
+            if cursor.description is not None:
+                columns = [column[0] for column in cursor.description]
+                dfs.append(pd.DataFrame.from_records([tuple(row) for row in cursor.fetchall()], columns=columns))
+            if not cursor.nextset():
+                break
+        cursor.close()
+    except pyodbc.Error:
+        # Discard the connection instead of returning it to the pool, in case it was dropped by the server.
+        connection.invalidate()
+        raise
+    finally:
+        connection.close()
+
+    return dfs
+
+#%% Function to load the seasons a player has played in, based on the competitions and player selected.
+
+@st.cache_data(ttl=600, hash_funcs=engine_hash_funcs)
+@retry_on_disconnect
+def load_player_seasons(sql_engine, minimum_seasons, player, selected_comps):
+    """
+    :param sql_engine: SQL alchemy engine connected to desired SQL server.
+    :param minimum_seasons: Minimum number of seasons that a player must have played in selected competition(s).
+    :param player: Player as selected in previous filter.
+    :param selected_comps: Tuple of competition names as selected in previous filter.
+    :return: List of seasons, latest first, that the selected player played in the selected competition(s).
+    """
+    # Return empty list if player or competitions not selected.
+    if not player or not selected_comps:
+        return []
+
+    # SQL query for unique seasons of selected player and competition(s).
+    query = """
         SELECT DISTINCT
-            player_name
+            season_name
         FROM streamlit.Fbref_Appearances
         WHERE number_of_seasons >= ?
-           AND competition_name IN ({placeholders})
+          AND player_name = ?
+          AND competition_name IN (SELECT value FROM STRING_SPLIT(?, '|'))
+        ORDER BY season_name DESC
     """
 
-    # Create dataframe using SQL query. The ?s are replaced by the selected competitions defined in params.
-    df = pd.read_sql(query, sql_engine, params=(minimum_seasons, *selected_comps))
+    # Create dataframe from query. First ? is minimum seasons, then selected player, then the |-separated competition(s).
+    df = pd.read_sql_query(query, sql_engine, params=(minimum_seasons, player, "|".join(selected_comps)))
 
-    # Sort dataframe and convert to list.
-    players = sorted(df["player_name"].tolist())
+    return df["season_name"].tolist()
 
-    return players
-
-#%% Function to load the player dataframe based on the competitions and player selected.
+#%% Function to load aggregated statistics for the competitions, player and seasons selected.
 
-@st.cache_data(ttl=600)
-def load_player_data(minimum_seasons, player, selected_comps):
+# Only the most recently used player cards are kept, so the cache doesn't keep growing as more players are viewed.
+@st.cache_data(ttl=3600, max_entries=256, hash_funcs=engine_hash_funcs)
+@retry_on_disconnect
+def load_player_aggregates(sql_engine, minimum_seasons, player, selected_comps, seasons):
     """
+    :param sql_engine: SQL alchemy engine connected to desired SQL server.
     :param minimum_seasons: Minimum number of seasons that a player must have played in selected competition(s).
     :param player: Player as selected in previous filter.
-    :param selected_comps: List of competition names as selected in previous filter.
-    :return: Dataframe containing data on the selected player in the selected competition(s).
+    :param selected_comps: Tuple of competition names as selected in previous filter.
+    :param seasons: Tuple of seasons as selected in previous filter. All seasons are included if empty.
+    :return: Dictionary of overview totals and most common values, appearances and goals per season, and teams
+             ordered by first season for the selected player.
     """
-    # Return empty dataframe if player or competitions not selected.
-    if not player or not selected_comps:
-        return pd.DataFrame()
-
-    # Connect to SQL server.
-    sql_engine = connect_to_sql_alchemy_server()
-
-    # Create a string of ?s, followed by a comma, the ?s will be replaced by the selected competitions. SQL Server uses ? placeholders.
-    placeholders = ",".join(["?"] * len(selected_comps))
-
-    # SQL query dataframe for selected player and competition(s).
-    query = f"""
-        SELECT *
+    # Filter shared by every statement. Seasons are only filtered on if at least one season was selected.
+    filters = """
         FROM streamlit.Fbref_Appearances
         WHERE number_of_seasons >= ?
           AND player_name = ?
-          AND competition_name IN ({placeholders})
+          AND competition_name IN (SELECT value FROM STRING_SPLIT(?, '|'))
+          AND (? = '' OR season_name IN (SELECT value FROM STRING_SPLIT(?, '|')))
     """
-    # Create dataframe from query. First ? is selected player, the following are the selected competition(s).
-    df = pd.read_sql(query, sql_engine, params=(minimum_seasons, player, *selected_comps))
 
-    return df
+    # Empty values are stored as -1, so they are set to NULL before summing or excluded when finding the most common
+    # value. Start year of each season is taken from season_name (e.g. "2015/2016" → 2015). Each statement returns one
+    # result set.
+    query = f"""
+        SET NOCOUNT ON;
 
+        SELECT
+            COUNT(*) AS appearances,
+            COALESCE(SUM(NULLIF(goals, -1)), 0) AS goals,
+            COALESCE(SUM(NULLIF(assists, -1)), 0) AS assists,
+            COALESCE(SUM(NULLIF(yellow_cards, -1)), 0) AS yellow_cards,
+            COALESCE(SUM(NULLIF(red_cards, -1)), 0) AS red_cards,
+            COALESCE(SUM(NULLIF(minutes_played, -1)), 0) AS minutes_played
+        {filters};
+
+        SELECT TOP 1
+            nationality
+        {filters}
+          AND nationality IS NOT NULL
+        GROUP BY nationality
+        ORDER BY COUNT(*) DESC, nationality;
+
+        SELECT TOP 1
+            player_position
+        {filters}
+          AND player_position <> 'N/A'
+        GROUP BY player_position
+        ORDER BY COUNT(*) DESC, player_position;
+
+        SELECT TOP 1
+            shirt_number
+        {filters}
+          AND NULLIF(shirt_number, -1) IS NOT NULL
+        GROUP BY shirt_number
+        ORDER BY COUNT(*) DESC, shirt_number;
+
+        SELECT TOP 1
+            number_of_seasons
+        {filters}
+          AND number_of_seasons IS NOT NULL
+        GROUP BY number_of_seasons
+        ORDER BY COUNT(*) DESC, number_of_seasons;
 
-#%% Build Streamlit app.
+        SELECT
+            TRY_CAST(LEFT(season_name, 4) AS INT) AS season_start,
+            COUNT(*) AS Appearances,
+            COALESCE(SUM(NULLIF(goals, -1)), 0) AS Goals
+        {filters}
+        GROUP BY season_name
+        ORDER BY season_start;
 
-def create_streamlit_app():
+        SELECT
+            team_name,
+            MIN(TRY_CAST(LEFT(season_name, 4) AS INT)) AS season_start
+        {filters}
+        GROUP BY team_name
+        ORDER BY season_start;
     """
-    :return:
+
+    # Run all statements in one round-trip. First ? is minimum seasons, then selected player, then the |-separated
+    # competition(s), then the |-separated season(s) twice (once to check if any were selected). The filter parameters
+    # are repeated once per statement.
+    selected_seasons = "|".join(seasons)
+    filter_params = (minimum_seasons, player, "|".join(selected_comps), selected_seasons, selected_seasons)
+    overview, *most_common, season_stats, team_order = read_sql_batch(sql_engine, query, filter_params * 7)
+
+    # Season years, appearances and goals per season all fit in 16-bit integers, which keeps later pandas work small.
+    season_stats = season_stats.astype({"season_start": "int16", "Appearances": "int16", "Goals": "int16"})
+
+    # Add most common values to the overview. If a value is unavailable for a player, use Unknown.
+    overview = overview.iloc[0].to_dict()
+    for df in most_common:
+        overview[df.columns[0]] = df.iat[0, 0] if not df.empty else "Unknown"
+
+    return overview, season_stats, team_order
+
+#%% Player card containing everything shown for the competitions, player and seasons selected.
+
+class PlayerCard(NamedTuple):
+    overview: dict
+    season_stats: pd.DataFrame
+    team_order: pd.DataFrame
+
+def load_player_card(sql_engine, minimum_seasons, player, selected_comps, seasons):
     """
-    # Set up page configuration.
-    st.set_page_config(
-        page_title="Players in European Competitions",
-        page_icon="C:/Users/conor/OneDrive/Desktop/OneTouch/Images/Logo_Youtube.png",
-        layout="wide",
-        initial_sidebar_state="expanded",
-        menu_items={
-            'Report a bug': "mailto:contact@onetouchinsights.com",
-            'About': "All data comes from Fbref European matches from 1990-2025. 2 seasons of European Cup (1990-1992), "
-                     "35 seasons of Champions League (1992-Present), 20 seasons of UEFA Cup (1990-2009), 16 seasons of "
-                     "Europa League (2010-Present), and 4 seasons of Europa Conference League (2021-Present)."
-        }
-    )
+    :param sql_engine: SQL alchemy engine connected to desired SQL server.
+    :param minimum_seasons: Minimum number of seasons that a player must have played in selected competition(s).
+    :param player: Player as selected in previous filter.
+    :param selected_comps: Tuple of competition names as selected in previous filter.
+    :param seasons: List of seasons as selected in previous filter. All seasons are included if empty.
+    :return: Player card with the overview, appearances and goals per season, and teams for the selected player.
+    """
+    # Seasons are sorted into a tuple, so the same selection made in a different order reuses the cached aggregates.
+    # Only load_player_aggregates is cached, with seasons in its key, as the most common values depend on the seasons
+    # selected. Its result is stored as a plain tuple and only named here.
+    return PlayerCard(*load_player_aggregates(sql_engine, minimum_seasons, player, selected_comps,
+                                              tuple(sorted(seasons))))
 
-    # Add latest game date in dataframe as a header.
-    st.markdown(f"<h1 style='color: #FF800E; font-size:14px;'>Latest game date: "
-                f"{load_latest_game_date().strftime('%B %d, %Y')}</h1>", unsafe_allow_html=True)
+#%% Function to build the appearances and goals per season chart.
 
-    # Set title.
-    st.markdown("<h1 style='text-align: center; color: #FF800E;'>⚽ European Competitions: Player overview ⚽</h1>",
-                unsafe_allow_html=True)
+@st.cache_data(ttl=600)
+def build_season_chart(season_stats):
+    """
+    :param season_stats: Dataframe containing appearances and goals for each season start year the player played in.
+    :return: Vega-Lite spec of the appearances bar chart and goals line chart, with data labels.
+    """
+    # Find first and last seasons that selected player played in.
+    all_seasons = np.arange(season_stats["season_start"].min(), season_stats["season_start"].max() + 1)
 
-    # Wrap all filters in a box.
-    with st.container(border=True):
-        # Step 1: Select competitions.
-        competitions = st.multiselect(
-            "Select a competition/competitions:",
-            options=sorted(load_competitions()),
-            default="Champions League"
-        )
+    # Add seasons where a player didn't play between their first and last seasons, with 0 appearances and goals.
+    season_stats = season_stats.set_index("season_start").reindex(all_seasons, fill_value=0).reset_index()
 
-        # Raise error if no competition selected.
-        if not competitions:
-            st.error("Please select at least one competition.")
-            return
+    # Rebuild proper season_name (e.g. 2015 -> 2015/2016), from the start years as one NumPy array.
+    season_start = season_stats["season_start"].to_numpy()
+    season_stats["Season"] = np.char.add(np.char.add(season_start.astype(str), "/"), (season_start + 1).astype(str))
 
-        # Step 2: Select minimum number of seasons a player must have played in the competition.
-        max_seasons = load_number_of_seasons(competitions)
-        minimum_seasons = st.slider(
-            label="Select minimum number of seasons:",
-            min_value=1,
-            max_value=max_seasons,
-            value=3 # Default value.
-        )
+    # Keep only the three columns from season_stats.
+    season_stats = season_stats[["Season", "Appearances", "Goals"]]
 
-        # Step 3: Select player.
-        players = load_players(minimum_seasons, competitions)
-        player = st.selectbox("Select a player:", players)
+    # Define appearances bar chart.
+    bars = alt.Chart(season_stats).mark_bar(color="#FF800E").encode(
+        x=alt.X("Season:N", title="Season"),
+        y=alt.Y("Appearances:Q", axis=alt.Axis(title="Appearances", labels=False, ticks=False, grid=False,
+                orient="left", titleColor="#FF800E")),
+        tooltip=["Season", "Appearances", "Goals"]
+    )
 
-        # Raise error if no player selected.
-        if not player:
-            st.error("Please select a player.")
-            return
+    # Define data labels for appearances.
+    bar_labels = alt.Chart(season_stats).mark_text(
+        align="center",
+        baseline="bottom",
+        dy=-2,  # Small offset above bar.
+        color="#FF800E"
+    ).encode(
+        x="Season:N",
+        y=alt.Y("Appearances:Q", axis=alt.Axis(title="Appearances", labels=False, ticks=False, grid=False,
+                                               orient="left", titleColor="#FF800E")),
+        text="Appearances:Q"
+    )
 
-        # Step 4: Load player data.
-        player_df = load_player_data(minimum_seasons, player, competitions)
+    # Define goals line chart.
+    line = alt.Chart(season_stats).mark_line(color="#1C9CE0", point=True).encode(
+        x="Season:N",
+        y=alt.Y("Goals:Q", axis=alt.Axis(title="Goals", labels=False, ticks=False, grid=False, orient="right",
+                                         titleColor="#1C9CE0")),
+        tooltip=["Season", "Goals"]
+    )
 
-        # Raise error if a selected player has not made at least one appearance in the selected competition.
-        if player_df.empty:
-            st.warning("No data available for this player in the selected competitions.")
-            return
+    # Define data labels for goals.
+    line_labels = alt.Chart(season_stats).mark_text(
+        align="left",
+        baseline="middle",
+        dx=8,  # offset to the right of the point
+        color="#1C9CE0"
+    ).encode(
+        x="Season:N",
+        y=alt.Y("Goals:Q", axis=alt.Axis(title="Goals", labels=False, ticks=False, grid=False, orient="right",
+                                         titleColor="#1C9CE0")),
+        text="Goals:Q"
+    )
 
-        # Step 4: Season filter.
-        seasons = st.multiselect(
-            "(Optional) Select a season/seasons:",
-            options=sorted(player_df["season_name"].unique(), reverse=True)
+    # Combine charts with dual axis.
+    chart = alt.layer(bars, bar_labels, line, line_labels).resolve_scale(
+        y="shared"  # Use the same scale for both y-axes.
+    )
+
+    return chart.to_dict()
+
+#%% Function to load the latest game date and all unique competition names at the same time.
+
+@st.cache_data(ttl=600, hash_funcs=engine_hash_funcs)
+def load_page_data(sql_engine):
+    """
+    :param sql_engine: SQL alchemy engine connected to desired SQL server.
+    :return: Date of the latest game and list containing all unique competition names.
+    """
+    # Neither loader depends on a filter, so both run in their own thread and wait on the server at the same time.
+    # Spinners are turned off for both, as Streamlit elements can't be drawn from outside the script thread.
+    async def gather_page_data():
+        return await asyncio.gather(
+            asyncio.to_thread(load_latest_game_date, sql_engine),
+            asyncio.to_thread(load_competitions, sql_engine)
         )
 
-        # If no season is selected, show stats for all seasons for the player. Otherwise, filter the dataframe.
-        if seasons:
-            final_df = player_df[player_df["season_name"].isin(seasons)]
-        else:
-            final_df = player_df
+    # Threads are only started on a cache miss of this wrapper, so a cache hit never creates an event loop.
+    latest_game_date, all_competitions = asyncio.run(gather_page_data())
 
-    # Replace empty values (= -1) with NULL values. Quicker for summing over columns.
-    final_df = final_df.replace(-1, pd.NA)
+    return latest_game_date, all_competitions
 
+#%% Function to show the overview statistics of the selected player.
+
+def render_overview(player, player_card):
+    """
+    :param player: Player as selected in previous filter.
+    :param player_card: Player card for the selected competitions, player and seasons.
+    :return:
+    """
     # Gather statistics for selected player.
-    total_appearances = len(final_df)
-    total_goals = final_df["goals"].sum(skipna=True)
-    total_assists = final_df["assists"].sum(skipna=True)
-    nationality = final_df["nationality"].mode().iat[0]
-    total_yellows = final_df["yellow_cards"].sum(skipna=True)
-    total_reds = final_df["red_cards"].sum(skipna=True)
-    minutes_played = final_df["minutes_played"].sum(skipna=True)
-    number_of_seasons = final_df["number_of_seasons"].mode().iat[0]
-
-    # If main position/shirt number for a player is unavailable, use Unknown.
-    main_position = (final_df.loc[final_df["player_position"] != "N/A", "player_position"].mode())
-    main_position = main_position.iat[0] if not main_position.empty else "Unknown"
-    shirt_number = (final_df.loc[final_df["shirt_number"].notna(), "shirt_number"].mode())
-    shirt_number = shirt_number.iat[0] if not shirt_number.empty else "Unknown"
-
-    # Find order for which a player played for a team
-    team_order = final_df.groupby("team_name")["season_name"].min().reset_index()
-    team_order["season_start"] = team_order["season_name"].str[:4].astype(int) # Order by season year.
-    team_order = team_order.sort_values("season_start")
-    teams = " – ".join(team_order["team_name"].tolist())
+    overview = player_card.overview
+    total_appearances = overview["appearances"]
+    total_goals = overview["goals"]
+    total_assists = overview["assists"]
+    total_yellows = overview["yellow_cards"]
+    total_reds = overview["red_cards"]
+    minutes_played = overview["minutes_played"]
+    nationality = overview["nationality"]
+    main_position = overview["player_position"]
+    shirt_number = overview["shirt_number"]
+    number_of_seasons = overview["number_of_seasons"]
+
+    # Teams in the order a player played for them, already sorted by the server.
+    teams = " – ".join(player_card.team_order["team_name"])
 
     # Player overview statistics.
     st.markdown(f"<h2 style='color:#FF800E;'>Player overview for {player.split(' (')[0]}:</h2>", unsafe_allow_html=True)
@@ -323,89 +523,126 @@ def create_streamlit_app():
         unsafe_allow_html=True
     )
 
+#%% Function to show the appearances and goals per season chart of the selected player.
+
+def render_season_chart(player, season_stats):
+    """
+    :param player: Player as selected in previous filter.
+    :param season_stats: Dataframe containing appearances and goals for each season start year the player played in.
+    :return:
+    """
     # Overview of appearances and goals per season.
     st.markdown(f"<h2 style='color:#FF800E;'>Appearances and goals per season for {player.split(' (')[0]}:</h2>", unsafe_allow_html=True)
     st.markdown("<hr style='border: none; height: 2px; background-color: #FF800E;'>", unsafe_allow_html=True)
 
-    # Aggregate appearances and goals per season.
-    season_stats = (
-        final_df.groupby("season_name")
-        .agg(Appearances=("player_name", "count"), Goals=("goals", "sum"))
-        .reset_index()
+    # Chart spec is cached, so it is only rebuilt when the appearances and goals per season change.
+    st.vega_lite_chart(build_season_chart(season_stats), use_container_width=True)
+
+#%% Fragment with the season filter, overview statistics and chart of the selected player.
+
+@st.fragment
+def render_player_card(sql_engine, minimum_seasons, player, competitions, player_seasons):
+    """
+    :param sql_engine: SQL alchemy engine connected to desired SQL server.
+    :param minimum_seasons: Minimum number of seasons that a player must have played in selected competition(s).
+    :param player: Player as selected in previous filter.
+    :param competitions: Tuple of competition names as selected in previous filter.
+    :param player_seasons: List of seasons, latest first, that the selected player played in.
+    :return:
+    """
+    # Step 5: Season filter. Drawn inside the fragment, so changing the seasons only reruns this fragment instead of
+    # the whole app.
+    with st.container(border=True):
+        seasons = st.multiselect(
+            "(Optional) Select a season/seasons:",
+            options=player_seasons
+        )
+
+    # Load statistics for selected player. If no season is selected, show stats for all seasons for the player.
+    player_card = load_player_card(sql_engine, minimum_seasons, player, competitions, seasons)
+
+    render_overview(player, player_card)
+    render_season_chart(player, player_card.season_stats)
+
+
+#%% Build Streamlit app.
+
+def create_streamlit_app():
+    """
+    :return:
+    """
+    # Set up page configuration.
+    st.set_page_config(
+        page_title="Players in European Competitions",
+        page_icon="C:/Users/conor/OneDrive/Desktop/OneTouch/Images/Logo_Youtube.png",
+        layout="wide",
+        initial_sidebar_state="expanded",
+        menu_items={
+            'Report a bug': "mailto:contact@onetouchinsights.com",
+            'About': "All data comes from Fbref European matches from 1990-2025. 2 seasons of European Cup (1990-1992), "
+                     "35 seasons of Champions League (1992-Present), 20 seasons of UEFA Cup (1990-2009), 16 seasons of "
+                     "Europa League (2010-Present), and 4 seasons of Europa Conference League (2021-Present)."
+        }
     )
 
-    # Sort by season.
-    season_stats = season_stats.sort_values("season_name")
+    # Connect to SQL server. The same engine is passed to every loader.
+    sql_engine = connect_to_sql_alchemy_server()
 
-    # Extract numeric start year from season_name (e.g. "2015/2016" → 2015).
-    season_stats["season_start"] = season_stats["season_name"].str[:4].astype(int)
+    # Load latest game date and all competitions in parallel.
+    latest_game_date, all_competitions = load_page_data(sql_engine)
 
-    # Find first and last seasons that selected player played in.
-    all_seasons = pd.DataFrame({
-        "season_start": range(season_stats["season_start"].min(),
-                              season_stats["season_start"].max() + 1)
-    })
+    # Add latest game date in dataframe as a header.
+    st.markdown(f"<h1 style='color: #FF800E; font-size:14px;'>Latest game date: "
+                f"{latest_game_date.strftime('%B %d, %Y')}</h1>", unsafe_allow_html=True)
 
-    # Merge with original dataframe to add seasons where a player didn't play between their first and last seasons.
-    season_stats = all_seasons.merge(season_stats, on="season_start", how="left")
+    # Set title.
+    st.markdown("<h1 style='text-align: center; color: #FF800E;'>⚽ European Competitions: Player overview ⚽</h1>",
+                unsafe_allow_html=True)
 
-    # Rebuild proper season_name (e.g. 2015 -> 2015/2016).
-    season_stats["Season"] = season_stats["season_start"].astype(str) + "/" + (season_stats["season_start"] + 1).astype(
-        str)
+    # Wrap all filters in a box.
+    with st.container(border=True):
+        # Step 1: Select competitions.
+        competitions = st.multiselect(
+            "Select a competition/competitions:",
+            options=all_competitions,
+            default="Champions League"
+        )
 
-    # Ensure appearances and goals where a player didn't play are set to 0.
-    season_stats[["Appearances", "Goals"]] = season_stats[["Appearances", "Goals"]].fillna(0).astype(int)
+        # Raise error if no competition selected.
+        if not competitions:
+            st.error("Please select at least one competition.")
+            return
 
-    # Keep only the three columns from season_stats.
-    season_stats = season_stats[["Season", "Appearances", "Goals"]]
+        # Sort competitions into a tuple, so the same selection made in a different order reuses every cached loader.
+        competitions = tuple(sorted(competitions))
 
-    # Define appearances bar chart.
-    bars = alt.Chart(season_stats).mark_bar(color="#FF800E").encode(
-        x=alt.X("Season:N", title="Season"),
-        y=alt.Y("Appearances:Q", axis=alt.Axis(title="Appearances", labels=False, ticks=False, grid=False,
-                orient="left", titleColor="#FF800E")),
-        tooltip=["Season", "Appearances", "Goals"]
-    )
+        # Step 2: Select minimum number of seasons a player must have played in the competition.
+        max_seasons = load_number_of_seasons(sql_engine, competitions)
+        minimum_seasons = st.slider(
+            label="Select minimum number of seasons:",
+            min_value=1,
+            max_value=max_seasons,
+            value=3 # Default value.
+        )
 
-    # Define data labels for appearances.
-    bar_labels = alt.Chart(season_stats).mark_text(
-        align="center",
-        baseline="bottom",
-        dy=-2,  # Small offset above bar.
-        color="#FF800E"
-    ).encode(
-        x="Season:N",
-        y=alt.Y("Appearances:Q", axis=alt.Axis(title="Appearances", labels=False, ticks=False, grid=False,
-                                               orient="left", titleColor="#FF800E")),
-        text="Appearances:Q"
-    )
+        # Step 3: Select player.
+        players = load_players(sql_engine, minimum_seasons, competitions)
+        player = st.selectbox("Select a player:", players)
 
-    # Define goals line chart.
-    line = alt.Chart(season_stats).mark_line(color="#1C9CE0", point=True).encode(
-        x="Season:N",
-        y=alt.Y("Goals:Q", axis=alt.Axis(title="Goals", labels=False, ticks=False, grid=False, orient="right",
-                                         titleColor="#1C9CE0")),
-        tooltip=["Season", "Goals"]
-    )
+        # Raise error if no player selected.
+        if not player:
+            st.error("Please select a player.")
+            return
 
-    # Define data labels for goals.
-    line_labels = alt.Chart(season_stats).mark_text(
-        align="left",
-        baseline="middle",
-        dx=8,  # offset to the right of the point
-        color="#1C9CE0"
-    ).encode(
-        x="Season:N",
-        y=alt.Y("Goals:Q", axis=alt.Axis(title="Goals", labels=False, ticks=False, grid=False, orient="right",
-                                         titleColor="#1C9CE0")),
-        text="Goals:Q"
-    )
+        # Step 4: Load seasons that the player played in.
+        player_seasons = load_player_seasons(sql_engine, minimum_seasons, player, competitions)
 
-    # Combine charts with dual axis.
-    chart = alt.layer(bars, bar_labels, line, line_labels).resolve_scale(
-        y="shared"  # Use the same scale for both y-axes.
-    )
+        # Raise error if a selected player has not made at least one appearance in the selected competition.
+        if not player_seasons:
+            st.warning("No data available for this player in the selected competitions.")
+            return
 
-    st.altair_chart(chart, use_container_width=True)
+    # Season filter, overview and chart of the selected player.
+    render_player_card(sql_engine, minimum_seasons, player, competitions, player_seasons)
 
 create_streamlit_app()